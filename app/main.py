@@ -1,41 +1,106 @@
 import logging
+import asyncio
 import base64
-import json
-from typing import Optional
+import hashlib
+import orjson
+from typing import Optional, Union
+from contextlib import asynccontextmanager, contextmanager, nullcontext, ExitStack
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from fastapi import FastAPI, Request, Header, HTTPException, status, BackgroundTasks
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, ORJSONResponse
 import httpx
 import tempfile
 import os
 from pathlib import Path
-from pypdf import PdfReader, PdfWriter, PageObject
+import pikepdf
 from PIL import Image, ImageFile, ImageOps
 Image.MAX_IMAGE_PIXELS = None # Allow big images.
 ImageFile.LOAD_TRUNCATED_IMAGES = True # Some of our JPFs require this.
 import io
 from io import BytesIO
-import atexit
+import multiprocessing
+import time
+import uuid
+import queue
+import shlex
 import shutil
-import pytesseract
+# One OpenMP thread per Tesseract instance; parallelism comes from the conversion worker
+# processes, and OpenMP threads across processes would contend for the same cores.
+# Must be set before tesserocr loads libtesseract.
+os.environ.setdefault("OMP_THREAD_LIMIT", "1")
+from tesserocr import PyTessBaseAPI, OEM, PSM
 from urllib.parse import urlparse, urljoin
 from datetime import datetime
 
 from fastapi.exceptions import RequestValidationError
 from fastapi.responses import JSONResponse
 
-# Standard DPI for PDF rendering
-DPI = int(os.getenv("MERGEPDF_DPI", "200"))
+# Standard DPI for PDF rendering. 150 DPI is enough for reading and text search, and
+# pixel counts (and so OCR and encoding time) grow with the square of the DPI.
+DPI = int(os.getenv("MERGEPDF_DPI", "150"))
 
 # Letter size in pixels at standard DPI
 LETTER_WIDTH_PX = int(8.5 * DPI)
 LETTER_HEIGHT_PX = int(11.0 * DPI)
 
+# Letter size in PDF points, for the page size of image-only pages
+LETTER_SIZE_PT = (8.5 * 72, 11.0 * 72)
+
+# Longest edge, in pixels, of the raster handed to Tesseract. Larger pages are OCRed from a
+# downscaled copy while the page image keeps its full resolution. Set to 0 to always OCR at DPI.
+OCR_MAX_EDGE = int(os.getenv("MERGEPDF_OCR_MAX_EDGE", "1500"))
+
+# Whether images are OCRed into searchable pages. Set `MERGEPDF_OCR=0` for image-only pages,
+# which skips Tesseract entirely.
+OCR_ENABLED = os.getenv("MERGEPDF_OCR", "1").lower() in ("1", "true", "yes")
+
+# How long, in seconds, the "Service File" media use TID looked up from each site is reused
+TID_CACHE_TTL = int(os.getenv("MERGEPDF_TID_CACHE_TTL", "3600"))
+
+# Tesseract options, in tesseract command-line syntax (`-l`, `--oem`, `--psm` and `-c var=value`).
+# Pages are single scans already fitted to the canvas, so the default skips automatic layout
+# analysis and runs the LSTM engine only.
+TESS_CONFIG = os.getenv("MERGEPDF_TESS_CONFIG", "-l eng --oem 1 --psm 6 -c tessedit_do_invert=0")
+
+# Maximum number of member files downloaded and converted at the same time
+CONCURRENCY = int(os.getenv("MERGEPDF_CONCURRENCY", "10"))
+
+# Number of worker processes for CPU-bound file conversion (Pillow, pikepdf, Tesseract)
+CONVERT_WORKERS = int(os.getenv("MERGEPDF_CONVERT_WORKERS", str(os.cpu_count() or 1)))
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logging.getLogger("httpx").setLevel(logging.WARNING)
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="Merge PDF API", version="1.0.0")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Create the persistent temp directory and the conversion pool, and share one HTTP client
+    (and its keep-alive connection pool) across all requests.
+    These are set up here rather than at import, as conversion workers import this module too.
+    """
+    global PERSISTENT_TEMP_DIR, CACHE_DIR, CONVERT_POOL
+    PERSISTENT_TEMP_DIR = tempfile.mkdtemp(prefix="mergepdf_", dir=TEMP_ROOT)
+    logger.info(f"Created persistent temp directory: {PERSISTENT_TEMP_DIR}")
+    CACHE_DIR = os.path.join(PERSISTENT_TEMP_DIR, "cache")
+    os.makedirs(CACHE_DIR)
+    FILE_ETAGS.clear()
+    CONVERT_POOL = _new_convert_pool()
+
+    limits = httpx.Limits(max_connections=128, max_keepalive_connections=64)
+    app.state.http = httpx.AsyncClient(http2=True, timeout=30.0, verify=False, limits=limits)
+    try:
+        yield
+    finally:
+        await app.state.http.aclose()
+        CONVERT_POOL.shutdown(wait=False, cancel_futures=True)
+        cleanup_temp_dir()
+
+
+app = FastAPI(title="Merge PDF API", version="1.0.0", lifespan=lifespan, default_response_class=ORJSONResponse)
 
 @app.exception_handler(RequestValidationError)
 async def validation_exception_handler(request: Request, exc: RequestValidationError):
@@ -55,13 +120,15 @@ KEEP_FILES = os.getenv("MERGEPDF_KEEP_FILES", "false").lower() in ("1", "true",
 logger.info(f"MERGEPDF_KEEP_FILES={KEEP_FILES}")
 
 
-# Directory for persistent temporary files
-PERSISTENT_TEMP_DIR = tempfile.mkdtemp(prefix="mergepdf_")
-logger.info(f"Created persistent temp directory: {PERSISTENT_TEMP_DIR}")
+# Directory for persistent temporary files, created under TEMP_ROOT at startup (see lifespan)
+# Defaults to the system temp directory; set `MERGEPDF_TMPDIR` to a tmpfs mount (e.g. /dev/shm) that is
+# large enough for the downloads in flight and the cache to keep temp writes in RAM
+TEMP_ROOT = os.getenv("MERGEPDF_TMPDIR") or None
+PERSISTENT_TEMP_DIR = None
 
 
 def cleanup_temp_dir():
-    """Clean up the persistent temporary directory on exit unless KEEP_FILES is set."""
+    """Clean up the persistent temporary directory on shutdown unless KEEP_FILES is set."""
     if KEEP_FILES:
         logger.info("KEEP_FILES enabled; skipping persistent temp directory cleanup on exit")
         return
@@ -73,8 +140,65 @@ def cleanup_temp_dir():
         logger.error(f"Error cleaning up temp directory: {str(e)}")
 
 
-# Register cleanup on application exit
-atexit.register(cleanup_temp_dir)
+# Images converted by earlier requests, kept by a hash of their content and with their ETags, so
+# unchanged files are revalidated instead of downloaded and converted again. Every member file is
+# still requested each time, so a file replaced in Drupal is always picked up. The cache is
+# trimmed to `MERGEPDF_CACHE_MAX_MB` (least recently used first); set it to 0 to disable caching.
+CACHE_DIR = None  # PERSISTENT_TEMP_DIR/cache
+CACHE_MAX_BYTES = int(os.getenv("MERGEPDF_CACHE_MAX_MB", "256")) * 1024 * 1024
+
+# ETag of each cached converted image, by (URL, whether it was OCRed)
+FILE_ETAGS = {}
+
+# "Service File" TID and the time it was looked up, by site base URL
+_TID_CACHE = {}
+_TID_LOCKS = {}  # base_url -> asyncio.Lock
+
+
+def _init_convert_worker():
+    """Load the Tesseract model when a conversion worker starts, rather than on its first image."""
+    if not OCR_ENABLED:
+        return
+    try:
+        _get_tess_api()
+    except Exception as e:
+        # Leave it to the first conversion to retry (and report per file) rather than breaking the pool
+        logger.error(f"Failed to initialize Tesseract in conversion worker: {str(e)}")
+
+
+# Process pool for file conversion, keeping CPU-bound work off the event loop; created at
+# startup (see lifespan). Workers are started on first use and load the Tesseract model as they
+# start. They are forked from a forkserver that has already imported the heavy libraries, rather
+# than from the running server with its event loop and HTTP client threads.
+_MP_CONTEXT = multiprocessing.get_context("forkserver")
+_MP_CONTEXT.set_forkserver_preload(["PIL.Image", "pikepdf", "tesserocr"])
+CONVERT_POOL = None
+
+
+def _new_convert_pool() -> ProcessPoolExecutor:
+    """Create a conversion pool."""
+    return ProcessPoolExecutor(max_workers=CONVERT_WORKERS, mp_context=_MP_CONTEXT, initializer=_init_convert_worker)
+
+
+async def convert_in_pool(*args) -> Optional[Union[BytesIO, str]]:
+    """
+    Run convert_to_pdf in the conversion pool.
+    A worker that dies (e.g. killed for running out of memory) breaks the whole pool, so a broken
+    pool is replaced and the conversion retried once.
+    """
+    global CONVERT_POOL
+    pool = CONVERT_POOL
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(pool, convert_to_pdf, *args)
+    except BrokenProcessPool:
+        # Conversions that failed together replace the pool once; there is no await between the
+        # check and the swap, so the event loop keeps them from interleaving
+        if CONVERT_POOL is pool:
+            logger.error("Conversion pool is broken (a worker died), starting a new one")
+            CONVERT_POOL = _new_convert_pool()
+            pool.shutdown(wait=False, cancel_futures=True)
+    return await loop.run_in_executor(CONVERT_POOL, convert_to_pdf, *args)
 
 
 @app.get("/")
@@ -101,14 +225,14 @@ async def merge_pdfs(
         raise HTTPException(status_code=400, detail="X-Islandora-Event header is required")
 
     try:
-        decoded = base64.b64decode(islandora_event).decode("utf-8")
-        event_json = json.loads(decoded)
+        # orjson decodes (and validates) the UTF-8 bytes itself
+        event_json = orjson.loads(base64.b64decode(islandora_event))
     except Exception as e:
         logger.error(f"Failed to decode/parse X-Islandora-Event: {str(e)}")
         raise HTTPException(status_code=400, detail="Invalid X-Islandora-Event header: must be base64 encoded JSON")
 
     # Expecting structure: { ..., "object": { "url": [ {"href": "..."}, ... ] }, ... }
-    logger.debug(f"Event object: {json.dumps(event_json)}")
+    logger.debug(f"Event object: {orjson.dumps(event_json).decode()}")
     href = None
     obj = event_json.get("object") if isinstance(event_json, dict) else None
     if isinstance(obj, dict):
@@ -126,13 +250,14 @@ async def merge_pdfs(
     # Build the members list URL
     members_url = f"{href.rstrip('/')}/members-list?_format=json"
     logger.info(f"Processing {members_url}")
+
+    client = request.app.state.http
     
     try:
         # Fetch the members list
-        with httpx.Client(timeout=30.0, verify=False) as client:
-            response = client.get(members_url)
-            response.raise_for_status()
-            members_data = response.json()
+        response = await client.get(members_url)
+        response.raise_for_status()
+        members_data = orjson.loads(response.content)
     except httpx.ConnectError as e:
         logger.error(f"Failed to connect to {members_url}: {str(e)}")
         raise HTTPException(
@@ -154,6 +279,8 @@ async def merge_pdfs(
     
     # Group files by nid and collect all file URLs for each, along with titles
     files_by_nid = {}
+    # Members of a view share the same keys, so the field_ keys are picked out once per key layout
+    field_keys_by_layout = {}
     for member in members_data:
         if not isinstance(member, dict):
             continue
@@ -166,13 +293,24 @@ async def merge_pdfs(
         if nid not in files_by_nid:
             files_by_nid[nid] = {
                 "title": member.get("title", "Unknown"),
-                "urls": []
+                "urls": [],
+                "ocr": OCR_ENABLED
             }
+
+        # Drupal already holds the text of files with extracted OCR text, so don't OCR them again
+        if member.get("field_ocr_text"):
+            files_by_nid[nid]["ocr"] = False
         
         # Find all field URLs for this nid
-        for key, value in member.items():
-            if key.startswith("field_") and isinstance(value, str) and value.startswith(("http://", "https://")):
-                files_by_nid[nid]["urls"].append(value)
+        layout = tuple(member)
+        field_keys = field_keys_by_layout.get(layout)
+        if field_keys is None:
+            field_keys = field_keys_by_layout[layout] = [key for key in layout if key[:6] == "field_"]
+        urls = files_by_nid[nid]["urls"]
+        for key in field_keys:
+            value = member[key]
+            if isinstance(value, str) and (value[:8] == "https://" or value[:7] == "http://"):
+                urls.append(value)
 
     # Remove nids with no files
     files_by_nid = {nid: data for nid, data in files_by_nid.items() if data["urls"]}
@@ -184,67 +322,40 @@ async def merge_pdfs(
     if not files_by_nid:
         raise HTTPException(status_code=400, detail=f"No files found in members data for {members_url}")
     
-    # Use persistent temp directory for file processing
-    processing_dir = os.path.join(PERSISTENT_TEMP_DIR, f"request_{id(href)}")
-    os.makedirs(processing_dir, exist_ok=True)
+    # Use persistent temp directory for file processing. The directory name is unique per request,
+    # so it never collides with one still being removed after an earlier request.
+    processing_dir = os.path.join(PERSISTENT_TEMP_DIR, f"request_{uuid.uuid4().hex}")
+    await asyncio.to_thread(os.makedirs, processing_dir, exist_ok=True)
     
     try:
-        pdf_files = []
-        
-        with httpx.Client(timeout=30.0, verify=False) as client:
-            for nid, data in files_by_nid.items():
-                file_urls = data["urls"]
-                pdf_path = None
-                for attempt, file_url in enumerate(file_urls, 1):
-                    try:
-                        logger.debug(f"Downloading file for nid {nid} (attempt {attempt}/{len(file_urls)}) from: {file_url}")
-                        response = client.get(file_url)
-                        response.raise_for_status()
-
-                        # Determine file extension from content-type
-                        content_type = response.headers.get("content-type", "application/octet-stream")
-                        file_bytes = response.content
-
-                        # Convert non-PDF files to PDF
-                        pdf_path = convert_to_pdf(file_bytes, content_type, processing_dir, nid)
-                        if pdf_path:
-                            logger.debug(f"Successfully converted file for nid {nid} from {file_url}")
-                            break  # Successfully converted, move to next nid
-                        else:
-                            logger.warning(f"Failed to convert file for nid {nid} from {file_url}, trying next URL if available")
-
-                    except httpx.ConnectError as e:
-                        logger.warning(f"Failed to download file from {file_url}: {str(e)}, trying next URL if available")
-                        continue
-                    except httpx.TimeoutException as e:
-                        logger.warning(f"Timeout downloading from {file_url}: {str(e)}, trying next URL if available")
-                        continue
-                    except Exception as e:
-                        logger.warning(f"Error processing nid {nid} file {file_url}: {str(e)}, trying next URL if available")
-                        continue
+        # Download and convert each nid concurrently, bounded by CONCURRENCY
+        semaphore = asyncio.Semaphore(CONCURRENCY)
+        results = await asyncio.gather(
+            *(fetch_and_convert(client, semaphore, nid, data["urls"], processing_dir, data["ocr"]) for nid, data in files_by_nid.items()),
+            return_exceptions=True
+        )
 
-                if pdf_path:
-                    pdf_files.append(pdf_path)
-                else:
-                    logger.error(f"Could not process any file URL for nid {nid}")
+        # Create a list of (pdf_buffer, title) tuples, preserving the members-list order
+        pdf_entries = []
+        for (nid, data), pdf_buffer in zip(files_by_nid.items(), results):
+            if isinstance(pdf_buffer, OSError):
+                # A local write failure (e.g. MERGEPDF_TMPDIR is full) would leave the file's pages out
+                raise HTTPException(status_code=500, detail=f"Failed to store file for nid {nid}: {str(pdf_buffer)}")
+            elif isinstance(pdf_buffer, Exception):
+                logger.error(f"Error processing nid {nid}: {str(pdf_buffer)}")
+            elif pdf_buffer:
+                pdf_entries.append((pdf_buffer, data.get("title", "Unknown")))
 
-        if not pdf_files:
+        if not pdf_entries:
             raise HTTPException(status_code=500, detail="Could not convert any files to PDF")
         
         # Merge PDFs with titles for outlines
-        logger.debug(f"Merging {len(pdf_files)} PDF files for {members_url}")
-        # Create a list of (pdf_path, title) tuples in the order they were processed
-        pdf_entries = []
-        for nid, data in files_by_nid.items():
-            # Find the corresponding pdf_path for this nid
-            for pdf_path in pdf_files:
-                if f"file_{nid}.pdf" in pdf_path:
-                    title = data.get("title", "Unknown")
-                    pdf_entries.append((pdf_path, title))
-                    break
-        merged_pdf_path = merge_pdf_files(pdf_entries, processing_dir)
+        logger.debug(f"Merging {len(pdf_entries)} PDF files for {members_url}")
+        merged_pdf = await asyncio.to_thread(merge_pdf_files, pdf_entries, processing_dir)
+
+        merged_size = merged_pdf.getbuffer().nbytes
         
-        logger.info(f"Successfully created merged PDF ({merged_pdf_path}) for {members_url}")
+        logger.info(f"Successfully created merged PDF ({merged_size} bytes) for {members_url}")
         
         # Extract base URL from href
         parsed_href = urlparse(href)
@@ -253,31 +364,9 @@ async def merge_pdfs(
         # Extract authorization token from request headers
         auth_token = request.headers.get("Authorization")
 
-        # Fetch TID from term endpoint
-        tid_endpoint = f"{base_url}/term_from_term_name?vocab=islandora_media_use&name=Service+File&_format=json"
-        logger.debug(f"Fetching TID from: {tid_endpoint}")
-
+        # Fetch TID from term endpoint (cached across requests)
         try:
-            with httpx.Client(timeout=30.0, verify=False) as client:
-                tid_response = client.get(tid_endpoint, headers={"Authorization": auth_token})
-                tid_response.raise_for_status()
-                tid_data = tid_response.json()
-
-                # Extract tid from .[0].tid[0].value
-                if isinstance(tid_data, list) and len(tid_data) > 0:
-                    first_item = tid_data[0]
-                    if isinstance(first_item, dict) and "tid" in first_item:
-                        tid_list = first_item["tid"]
-                        if isinstance(tid_list, list) and len(tid_list) > 0:
-                            tid_obj = tid_list[0]
-                            tid = tid_obj.get("value") if isinstance(tid_obj, dict) else tid_obj
-                            logger.debug(f"Extracted TID: {tid}")
-                        else:
-                            raise ValueError("tid array is empty or not found")
-                    else:
-                        raise ValueError("First item does not have tid field")
-                else:
-                    raise ValueError("TID response is not a list or is empty")
+            tid = await get_service_file_tid(client, base_url, auth_token)
         except Exception as e:
             logger.error(f"Failed to fetch TID: {str(e)}")
             raise HTTPException(status_code=500, detail=f"Failed to fetch TID: {str(e)}")
@@ -295,11 +384,10 @@ async def merge_pdfs(
             logger.debug("Using Authorization token from incoming request")
 
         try:
-            put_headers["Content-Length"] = str(os.path.getsize(merged_pdf_path))
-            with open(merged_pdf_path, "rb") as pdf_file:
-                response = httpx.put(put_url, content=pdf_file, headers=put_headers, timeout=60.0, verify=False)
-                response.raise_for_status()
-                logger.info(f"Successfully PUT PDF to {put_url}")
+            put_headers["Content-Length"] = str(merged_size)
+            response = await client.put(put_url, content=iter_chunks(merged_pdf), headers=put_headers, timeout=60.0)
+            response.raise_for_status()
+            logger.info(f"Successfully PUT PDF to {put_url}")
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Failed to PUT PDF to {put_url}: {str(e)}")
 
@@ -310,36 +398,485 @@ async def merge_pdfs(
         return {"status": "success", "message": f"PDF successfully merged and uploaded to {put_url}"}
     
     except HTTPException:
+        # Drop the downloads of a failed request (only if not KEEP_FILES)
+        if not KEEP_FILES:
+            await asyncio.to_thread(shutil.rmtree, processing_dir, ignore_errors=True)
         raise
     except Exception as e:
         logger.error(f"Error in merge_pdfs for {members_url}: {str(e)}")
         # Clean up processing directory on error (only if not KEEP_FILES)
         try:
             if not KEEP_FILES:
-                shutil.rmtree(processing_dir, ignore_errors=True)
+                await asyncio.to_thread(shutil.rmtree, processing_dir, ignore_errors=True)
         except Exception:
             pass
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
 
 
-def _fit_image_to_pdf(file_bytes: bytes, temp_dir: str, identifier: str) -> str:
+def _file_cache_path(file_url: str, ocr: bool) -> str:
+    """Path of the cached converted PDF for a member file URL, converted with or without OCR."""
+    url_hash = hashlib.sha256(file_url.encode('utf-8')).hexdigest()
+    return os.path.join(CACHE_DIR, f"file_{url_hash}.pdf" if ocr else f"file_{url_hash}_noocr.pdf")
+
+
+def read_cached_file(file_url: str, ocr: bool, link_path: str) -> Optional[str]:
+    """
+    Look up the PDF converted from a member file (with OCR or not, as ocr says) and return the ETag
+    it was cached under, or None if it is not cached.
+    The cached PDF is hard-linked to link_path rather than read, so nothing is loaded unless the
+    server confirms the file is unchanged.
+    """
+    etag = FILE_ETAGS.get((file_url, ocr))
+    if etag is None or CACHE_MAX_BYTES <= 0:
+        return None
+    if not _link_cache_entry(os.path.basename(_file_cache_path(file_url, ocr)), link_path):
+        # Evicted
+        FILE_ETAGS.pop((file_url, ocr), None)
+        return None
+    return etag
+
+
+def store_cached_file(file_url: str, ocr: bool, etag: str, digest: str) -> None:
+    """
+    Cache the PDF converted from a member file (with OCR or not, as ocr says) under the file's ETag.
+    The entry is a hard link to the image's content entry (see store_cached_image), so the PDF is
+    only stored once; nothing is cached if that entry is missing.
+    """
+    if CACHE_MAX_BYTES <= 0:
+        return
+    try:
+        # Link under a scratch name and rename, replacing the entry for an earlier version of the file
+        scratch_path = os.path.join(CACHE_DIR, f"{uuid.uuid4().hex}.part")
+        if not _link_cache_entry(_image_cache_name(digest, ocr), scratch_path):
+            return
+        os.replace(scratch_path, _file_cache_path(file_url, ocr))
+        FILE_ETAGS[(file_url, ocr)] = etag
+    except Exception as e:
+        logger.error(f"Failed to cache converted file {file_url}: {str(e)}")
+
+
+def _image_cache_name(digest: str, ocr: bool) -> str:
+    """Cache entry name for the PDF converted from an image with the given SHA-256 content digest."""
+    return f"image_{digest}.pdf" if ocr else f"image_{digest}_noocr.pdf"
+
+
+def read_cached_image(digest: str, ocr: bool, link_path: str) -> Optional[str]:
+    """
+    Hard-link the PDF previously converted from an image with the same content to link_path and
+    return link_path, or return None if it is not cached.
+    Unlike the ETag cache, this also catches the same image served from another URL or without an ETag.
+    """
+    if CACHE_MAX_BYTES <= 0 or not _link_cache_entry(_image_cache_name(digest, ocr), link_path):
+        return None
+    return link_path
+
+
+def store_cached_image(digest: str, ocr: bool, pdf_buffer: BytesIO) -> None:
+    """Cache the PDF converted from an image under the image's content digest."""
+    if CACHE_MAX_BYTES <= 0:
+        return
+    try:
+        _write_cache_entry(_image_cache_name(digest, ocr), pdf_buffer)
+        _evict_cache_entries()
+    except Exception as e:
+        logger.error(f"Failed to cache converted image {digest}: {str(e)}")
+
+
+def _link_cache_entry(name: str, link_path: str) -> bool:
+    """
+    Hard-link a cached PDF to link_path and mark it as recently used. Returns False if it is not cached.
+    The link keeps the PDF readable (and memory-mappable by the merge) even if it is evicted meanwhile.
+    """
+    cache_path = os.path.join(CACHE_DIR, name)
+    try:
+        os.link(cache_path, link_path)
+        os.utime(cache_path)
+    except FileNotFoundError:
+        return False
+    return True
+
+
+def _write_cache_entry(name: str, pdf: Union[BytesIO, str]) -> None:
+    """Write a PDF into the cache directory under a scratch name and rename it, so readers never see a partial file."""
+    fd, scratch_path = tempfile.mkstemp(suffix=".part", dir=CACHE_DIR)
+    os.close(fd)
+    _write_pdf(pdf, scratch_path)
+    os.replace(scratch_path, os.path.join(CACHE_DIR, name))
+
+
+def _evict_cache_entries() -> None:
+    """
+    Remove the least recently used cached PDFs until the cache fits CACHE_MAX_BYTES.
+    Entries hard-linked to the same PDF are counted once and removed together.
+    Several threads may evict at once, so entries that are already gone are skipped.
+    """
+    pdfs = {}
+    for entry in os.scandir(CACHE_DIR):
+        if not entry.name.endswith(".pdf"):
+            continue
+        try:
+            stat = entry.stat()
+        except FileNotFoundError:
+            continue
+        pdfs.setdefault((stat.st_dev, stat.st_ino), (stat.st_mtime, stat.st_size, []))[2].append(entry.path)
+    total_size = sum(size for _, size, _ in pdfs.values())
+    removed = set()
+    for _, size, paths in sorted(pdfs.values()):
+        if total_size <= CACHE_MAX_BYTES:
+            break
+        for path in paths:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        total_size -= size
+        removed.update(os.path.basename(path) for path in paths)
+        logger.debug(f"Evicted cached PDF {', '.join(paths)}")
+
+    # Forget the ETags of evicted files, so FILE_ETAGS stays as small as the cache
+    if removed:
+        for key in list(FILE_ETAGS):
+            if os.path.basename(_file_cache_path(*key)) in removed:
+                FILE_ETAGS.pop(key, None)
+
+
+async def get_service_file_tid(client: httpx.AsyncClient, base_url: str, auth_token: Optional[str]) -> str:
+    """
+    Look up the TID of the "Service File" media use term on base_url.
+    The TID is cached per site for TID_CACHE_TTL seconds, so most requests skip the lookup.
+    """
+    cached = _TID_CACHE.get(base_url)
+    if cached and time.monotonic() - cached[1] < TID_CACHE_TTL:
+        return cached[0]
+
+    # One lookup per site at a time; requests waiting on it use its result, and other sites aren't held up
+    async with _TID_LOCKS.setdefault(base_url, asyncio.Lock()):
+        cached = _TID_CACHE.get(base_url)
+        if cached and time.monotonic() - cached[1] < TID_CACHE_TTL:
+            return cached[0]
+
+        tid_endpoint = f"{base_url}/term_from_term_name?vocab=islandora_media_use&name=Service+File&_format=json"
+        logger.debug(f"Fetching TID from: {tid_endpoint}")
+        tid_response = await client.get(tid_endpoint, headers={"Authorization": auth_token})
+        tid_response.raise_for_status()
+        tid_data = orjson.loads(tid_response.content)
+
+        # Extract tid from .[0].tid[0].value
+        if isinstance(tid_data, list) and len(tid_data) > 0:
+            first_item = tid_data[0]
+            if isinstance(first_item, dict) and "tid" in first_item:
+                tid_list = first_item["tid"]
+                if isinstance(tid_list, list) and len(tid_list) > 0:
+                    tid_obj = tid_list[0]
+                    tid = tid_obj.get("value") if isinstance(tid_obj, dict) else tid_obj
+                    logger.debug(f"Extracted TID: {tid}")
+                else:
+                    raise ValueError("tid array is empty or not found")
+            else:
+                raise ValueError("First item does not have tid field")
+        else:
+            raise ValueError("TID response is not a list or is empty")
+
+        _TID_CACHE[base_url] = (tid, time.monotonic())
+        return tid
+
+
+async def iter_chunks(stream: BytesIO, chunk_size: int = 64 * 1024):
+    """Yield a binary stream in chunks, for use as a streamed request body."""
+    while chunk := stream.read(chunk_size):
+        yield chunk
+
+
+async def download_to_file(response: httpx.Response, path: str, chunk_size: int = 1024 * 1024) -> tuple:
+    """
+    Write a streamed response body to a file, one chunk at a time, so memory use per download
+    stays bounded whatever the file size.
+    Returns (head, digest): the leading bytes, for sniffing the file type, and the SHA-256 hex
+    digest of the body, hashed as it streams past.
+    The file is opened, written and closed in worker threads, so disk I/O never blocks the event loop.
+    """
+    head = b""
+    digest = hashlib.sha256()
+    f = await asyncio.to_thread(open, path, "wb")
+    try:
+        async for chunk in response.aiter_bytes(chunk_size):
+            if len(head) < SNIFF_BYTES:
+                head += chunk[:SNIFF_BYTES - len(head)]
+            digest.update(chunk)
+            await asyncio.to_thread(f.write, chunk)
+    finally:
+        await asyncio.to_thread(f.close)
+    return head, digest.hexdigest()
+
+
+async def fetch_and_convert(client: httpx.AsyncClient, semaphore: asyncio.Semaphore, nid: str, file_urls: list, processing_dir: str, ocr: bool = True) -> Optional[Union[BytesIO, str]]:
+    """
+    Download and convert the files for a single nid.
+    URLs are tried in order until one converts to PDF successfully.
+    Files are downloaded into processing_dir; images are OCRed unless ocr is False.
+    Returns the PDF as an in-memory buffer or a path, or None if no URL could be processed.
+    """
+    async with semaphore:
+        for attempt, file_url in enumerate(file_urls, 1):
+            try:
+                logger.debug(f"Downloading file for nid {nid} (attempt {attempt}/{len(file_urls)}) from: {file_url}")
+
+                # Revalidate a previously converted file rather than downloading it again
+                cached_path = os.path.join(processing_dir, f"cached_{nid}_{attempt}.pdf")
+                cached_etag = await asyncio.to_thread(read_cached_file, file_url, ocr, cached_path)
+                headers = {"If-None-Match": cached_etag} if cached_etag else {}
+                async with client.stream("GET", file_url, headers=headers) as response:
+                    if cached_etag and response.status_code == 304:
+                        logger.debug(f"File for nid {nid} unchanged at {file_url}, using cached conversion")
+                        return cached_path
+                    if cached_etag:
+                        await asyncio.to_thread(os.remove, cached_path)
+                    response.raise_for_status()
+
+                    # Determine file extension from content-type
+                    content_type = response.headers.get("content-type", "application/octet-stream")
+                    etag = response.headers.get("etag")
+                    download_path = os.path.join(processing_dir, f"download_{nid}_{attempt}")
+                    head, digest = await download_to_file(response, download_path)
+
+                # Convert non-PDF files to PDF in the process pool, which opens the downloaded file
+                # itself, unless an image with the same content has been converted before.
+                # PDFs are merged straight from the downloaded file.
+                if is_pdf(head, content_type):
+                    pdf_buffer = await asyncio.to_thread(convert_to_pdf, download_path, content_type, processing_dir, nid, ocr)
+                else:
+                    pdf_buffer = await asyncio.to_thread(read_cached_image, digest, ocr, cached_path)
+                    if pdf_buffer:
+                        logger.debug(f"File for nid {nid} from {file_url} matches a cached conversion")
+                    else:
+                        pdf_buffer = await convert_in_pool(download_path, content_type, processing_dir, nid, ocr)
+                        if pdf_buffer:
+                            await asyncio.to_thread(store_cached_image, digest, ocr, pdf_buffer)
+                    # Only conversions are worth keeping; a PDF would just be a copy of the download
+                    if pdf_buffer and etag:
+                        await asyncio.to_thread(store_cached_file, file_url, ocr, etag, digest)
+                    if not KEEP_FILES:
+                        await asyncio.to_thread(os.remove, download_path)
+                if pdf_buffer:
+                    logger.debug(f"Successfully converted file for nid {nid} from {file_url}")
+                    return pdf_buffer
+                else:
+                    logger.warning(f"Failed to convert file for nid {nid} from {file_url}, trying next URL if available")
+
+            except httpx.ConnectError as e:
+                logger.warning(f"Failed to download file from {file_url}: {str(e)}, trying next URL if available")
+                continue
+            except httpx.TimeoutException as e:
+                logger.warning(f"Timeout downloading from {file_url}: {str(e)}, trying next URL if available")
+                continue
+            except OSError as e:
+                # Conversion errors are handled in convert_to_pdf, so this is a local file error (e.g. a full
+                # MERGEPDF_TMPDIR) that the next URL would hit too; fail the merge rather than drop the file
+                logger.error(f"Failed to store file for nid {nid} from {file_url}: {str(e)}")
+                raise
+            except Exception as e:
+                logger.warning(f"Error processing nid {nid} file {file_url}: {str(e)}, trying next URL if available")
+                continue
+
+    logger.error(f"Could not process any file URL for nid {nid}")
+    return None
+
+
+# Tesseract API for this process, created when a conversion worker starts (or on first use
+# outside the pool) so the language model is loaded once per process instead of once per image.
+# The API is not thread-safe; each worker process converts one file at a time.
+_TESS_API = None
+
+
+def _parse_tess_config(config: str) -> tuple:
+    """
+    Parse tesseract command-line options into (lang, oem, psm, variables) for PyTessBaseAPI.
+    `--dpi` is accepted and ignored, as each page's DPI is set when it is OCRed.
+    Raises ValueError for options the API can't take or missing or malformed values.
+    """
+    lang, oem, psm, variables = "eng", OEM.DEFAULT, PSM.AUTO, {}
+    args = iter(shlex.split(config))
+    for arg in args:
+        if arg not in ("-l", "--oem", "--psm", "--dpi", "-c"):
+            raise ValueError(f"Unsupported option in MERGEPDF_TESS_CONFIG: {arg}")
+        value = next(args, None)
+        if value is None:
+            raise ValueError(f"Missing value for {arg} in MERGEPDF_TESS_CONFIG")
+        if arg == "-l":
+            lang = value
+        elif arg == "--oem":
+            oem = int(value)
+        elif arg == "--psm":
+            psm = int(value)
+        elif arg == "-c":
+            name, sep, value = value.partition("=")
+            if not name or not sep:
+                raise ValueError(f"Expected -c var=value in MERGEPDF_TESS_CONFIG, got: {name}")
+            variables[name] = value
+    return lang, oem, psm, variables
+
+
+# Parsed at import, so an invalid MERGEPDF_TESS_CONFIG stops the service from starting rather
+# than failing every conversion
+TESS_OPTIONS = _parse_tess_config(TESS_CONFIG)
+
+
+def _get_tess_api() -> PyTessBaseAPI:
+    """Return this process's Tesseract API, configured to render text-only PDFs."""
+    global _TESS_API
+    if _TESS_API is None:
+        lang, oem, psm, variables = TESS_OPTIONS
+        _TESS_API = PyTessBaseAPI(lang=lang, oem=oem, psm=psm)
+        for name, value in variables.items():
+            _TESS_API.SetVariable(name, value)
+        _TESS_API.SetVariable("tessedit_create_pdf", "1")
+        _TESS_API.SetVariable("textonly_pdf", "1")
+    return _TESS_API
+
+
+def _ocr_image_to_pdf(image: Image.Image, dpi: int) -> bytes:
+    """
+    OCR an image with the in-process Tesseract API and return a single-page PDF holding just
+    the invisible text layer, without the image.
+    The PDF renderer reads its input from a file, so the image is staged in a scratch directory,
+    as an uncompressed BMP to skip an encode.
+    """
+    api = _get_tess_api()
+    api.SetVariable("user_defined_dpi", str(dpi))
+    with tempfile.TemporaryDirectory(prefix="mergepdf_ocr_", dir=TEMP_ROOT) as ocr_dir:
+        image_path = os.path.join(ocr_dir, "page.bmp")
+        image.save(image_path)
+        output_base = os.path.join(ocr_dir, "page")
+        if not api.ProcessPages(output_base, image_path, None, 0):
+            raise RuntimeError("Tesseract failed to render PDF")
+        with open(f"{output_base}.pdf", "rb") as f:
+            return f.read()
+
+
+# White letter canvas kept for reuse. Conversions within a worker process run one at a time, so
+# one canvas is enough; it is replaced when a page needs another size, so oversized pages (each
+# OCRed at its own DPI) don't pile up canvases.
+_CANVAS_POOL = queue.LifoQueue(maxsize=1)
+
+
+@contextmanager
+def _letter_canvas(image: Image.Image, dpi: int):
+    """
+    Place an image at the bottom left of a white Letter-sized (8.5x11) canvas at the given DPI,
+    so the page rendered from it needs no resizing afterwards.
+    The canvas is grayscale, which is all Tesseract reads, and is taken from a pool and only the pasted region is wiped when it is returned.
+    """
+    size = (int(8.5 * dpi), int(11.0 * dpi))
+    try:
+        canvas = _CANVAS_POOL.get_nowait()
+    except queue.Empty:
+        canvas = None
+    if canvas is not None and canvas.size != size:
+        canvas.close()
+        canvas = None
+    if canvas is None:
+        canvas = Image.new("L", size, 255)
+
+    box = (0, size[1] - image.height, image.width, size[1])
+    canvas.paste(image, box[:2])
+    try:
+        yield canvas
+    finally:
+        canvas.paste(255, box)
+        try:
+            _CANVAS_POOL.put_nowait(canvas)
+        except queue.Full:
+            canvas.close()
+
+
+def _is_blank(image: Image.Image, max_range: int = 32) -> bool:
+    """
+    Check whether an image is a near-solid page (no ink to OCR).
+    The image is box-reduced first, which averages away scanner noise but keeps any text dark enough to count.
+    """
+    factor = max(1, max(image.size) // 512)
+    with image.convert("L").reduce(factor) as gray:
+        low, high = gray.getextrema()
+    return high - low < max_range
+
+
+# EXIF tag holding the camera orientation; 1 means the pixels are stored upright
+EXIF_ORIENTATION = 0x0112
+
+
+def _draw_jpeg(pdf: pikepdf.Pdf, page: pikepdf.Page, jpeg_bytes: bytes, size: tuple, mode: str, dpi: int) -> None:
+    """
+    Draw a JPEG at the given DPI from the bottom left of a page, beneath the page's existing content.
+    The JPEG data is embedded verbatim as a DCTDecode image, so its pixels are never decoded or re-encoded.
+    """
+    image = pikepdf.Stream(
+        pdf, jpeg_bytes,
+        Type=pikepdf.Name.XObject, Subtype=pikepdf.Name.Image,
+        Width=size[0], Height=size[1], BitsPerComponent=8,
+        ColorSpace=pikepdf.Name.DeviceRGB if mode == "RGB" else pikepdf.Name.DeviceGray,
+        Filter=pikepdf.Name.DCTDecode,
+    )
+    name = page.add_resource(image, pikepdf.Name.XObject, prefix="Im")
+    width_pt, height_pt = size[0] * 72 / dpi, size[1] * 72 / dpi
+    page.contents_add(pdf.make_stream(f"q {width_pt:.4f} 0 0 {height_pt:.4f} 0 0 cm {name} Do Q".encode("ascii")), prepend=True)
+
+
+def _jpeg_page_pdf(jpeg_bytes: bytes, size: tuple, mode: str, dpi: int) -> BytesIO:
+    """Build a Letter-sized (8.5x11) single-page PDF showing a JPEG at the given DPI from the bottom left."""
+    with pikepdf.Pdf.new() as pdf:
+        page = pdf.add_blank_page(page_size=LETTER_SIZE_PT)
+        _draw_jpeg(pdf, page, jpeg_bytes, size, mode, dpi)
+        pdf_buffer = BytesIO()
+        pdf.save(pdf_buffer)
+    pdf_buffer.seek(0)
+    return pdf_buffer
+
+
+def _fit_image_to_pdf(source: Union[bytes, str], ocr: bool = True) -> BytesIO:
     """
     Convert an image to PDF, fitting it within a standard letter-size canvas (8.5" x 11").
-    The image is scaled proportionally to fit within the canvas and centered on a white background.
-    Returns the path to the created PDF.
+    The image is scaled proportionally to fit within the canvas and placed at its bottom left, on a white background.
+    The page is OCRed into a searchable PDF unless ocr is False or the image is blank.
+    source is the image file's bytes or its path.
+    Returns the created PDF as an in-memory buffer.
     """
-    image = Image.open(io.BytesIO(file_bytes))
+    image = Image.open(source if isinstance(source, str) else io.BytesIO(source))
     image_filename = image.filename
     image_format = image.format
     image_size = image.size
     logger.debug(f"{image_filename} ({image_format}), {image_size}")
+
+    # An RGB or grayscale JPEG that ends up needing no rotation or scaling can be embedded
+    # in the PDF as it is, rather than decoded and encoded again
+    passthrough_mode = image.mode if image_format == "JPEG" and image.mode in ("RGB", "L") else None
+    if image.getexif().get(EXIF_ORIENTATION, 1) != 1:
+        passthrough_mode = None
+
+    # Oversized JPEGs and JPEG 2000s are decoded straight at a reduced scale (1/2, 1/4, ... by
+    # libjpeg's DCT scaling or OpenJPEG's resolution levels), keeping at least twice the final
+    # page size. This is the reduction thumbnail()'s reducing_gap would make, but it only takes
+    # effect before the image is loaded.
+    short_edge, long_edge = sorted(image_size)
+    fit_scale = min(LETTER_WIDTH_PX / short_edge, LETTER_HEIGHT_PX / long_edge)
+    reduce_level = int(1 / (fit_scale * 2)).bit_length() - 1 if fit_scale < 0.5 else 0
+    if reduce_level and image_format in ("JPEG", "JPEG2000"):
+        if image_format == "JPEG":
+            image.draft(None, (int(image.width * fit_scale * 2), int(image.height * fit_scale * 2)))
+        else:
+            image.reduce = reduce_level
+        logger.debug(f"Decoding {image_filename} at 1/{1 << reduce_level} scale")
     
     try:
-        # Convert to RGB if necessary (for RGBA, LA, P modes)
-        if image.mode in ("RGBA", "LA", "P"):
+        # Convert to RGB if necessary. Only images with transparency are composited onto white;
+        # opaque palette images are converted directly, in a single pass.
+        if image.mode == "P" and "transparency" in image.info:
+            rgba_image = image.convert("RGBA")
+            image.close()
+            image = rgba_image
+        if image.mode in ("RGBA", "LA"):
             rgb_image = Image.new("RGB", image.size, (255, 255, 255))
-            rgb_image.paste(image, mask=image.split()[-1] if image.mode in ("RGBA", "LA") else None)
+            rgb_image.paste(image, mask=image.getchannel("A"))
             image.close()
             image = rgb_image
         elif image.mode != "RGB":
@@ -347,10 +884,32 @@ def _fit_image_to_pdf(file_bytes: bytes, temp_dir: str, identifier: str) -> str:
             image.close()
             image = converted_image
         
-        # Force orientation
-        transposed_image = ImageOps.exif_transpose(image)
-        image.close()
-        image = transposed_image
+        # Get original image dimensions
+        orig_width, orig_height = image.size
+
+        # Calculate scaling factor to fit within the letter canvas while maintaining aspect ratio.
+        # The page is turned to portrait below, so its short edge fits the width and its long edge the height.
+        short_edge, long_edge = sorted(image.size)
+        scale_factor = min(LETTER_WIDTH_PX / short_edge, LETTER_HEIGHT_PX / long_edge, 1.0)  # Don't upscale
+
+        # Resize the image in place if needed, so the full-size pixels are released straight away.
+        # This comes before any rotation, so rotating only moves the page-sized pixels; the box
+        # follows the image's current orientation.
+        # BILINEAR is several times cheaper than LANCZOS and looks the same at these scales; LANCZOS
+        # is kept for heavy downscales where its sharper kernel shows. reducing_gap lets Pillow shrink
+        # by an integer factor with a cheap box reduce first, so the filter only covers the last
+        # (at most 2x) step.
+        if scale_factor < 1.0:
+            resample = Image.Resampling.LANCZOS if scale_factor < 0.3 else Image.Resampling.BILINEAR
+            box = (LETTER_WIDTH_PX, LETTER_HEIGHT_PX) if orig_width <= orig_height else (LETTER_HEIGHT_PX, LETTER_WIDTH_PX)
+            image.thumbnail(box, resample, reducing_gap=2.0)
+            logger.debug(f"Scaled image from {orig_width}x{orig_height} to {image.width}x{image.height}")
+
+        # Force orientation. exif_transpose copies the image even when it is already upright.
+        if image.getexif().get(EXIF_ORIENTATION, 1) != 1:
+            transposed_image = ImageOps.exif_transpose(image)
+            image.close()
+            image = transposed_image
         
         if image.width > image.height:
             logger.debug(f"Rotating image {image_filename} ({image.width}x{image.height}) to portrait.")
@@ -359,112 +918,182 @@ def _fit_image_to_pdf(file_bytes: bytes, temp_dir: str, identifier: str) -> str:
             image.close()
             image = rotated_image
 
-        # Get original image dimensions
-        orig_width, orig_height = image.size
-        
-        # Calculate scaling factor to fit within the letter canvas while maintaining aspect ratio
-        scale_width = LETTER_WIDTH_PX / orig_width
-        scale_height = LETTER_HEIGHT_PX / orig_height
-        scale_factor = min(scale_width, scale_height, 1.0)  # Don't upscale
-        
-        # Calculate new image dimensions
-        new_width = int(orig_width * scale_factor)
-        new_height = int(orig_height * scale_factor)
-        
-        # Resize the image if needed
-        if scale_factor < 1.0:
-            resized_image = image.resize((new_width, new_height), Image.Resampling.LANCZOS)
-            image.close()
-            image = resized_image
-            logger.debug(f"Scaled image from {orig_width}x{orig_height} to {new_width}x{new_height}")
-        
-        # OCR and convert to PDF
-        pdf_bytes = pytesseract.image_to_pdf_or_hocr(image, extension='pdf', config=f"--dpi {DPI}")
-        pdf_reader = PdfReader(io.BytesIO(pdf_bytes))
+        # The page image, as JPEG data that is embedded in the PDF verbatim
+        if image.size != image_size:
+            passthrough_mode = None
+        if passthrough_mode:
+            if isinstance(source, str):
+                with open(source, "rb") as f:
+                    source = f.read()
+            jpeg_bytes, jpeg_mode = bytes(source), passthrough_mode
+            logger.debug(f"Embedding JPEG {image_filename} without re-encoding")
+        else:
+            jpeg_buffer = BytesIO()
+            image.save(jpeg_buffer, format="JPEG", quality=85)
+            jpeg_bytes, jpeg_mode = jpeg_buffer.getvalue(), "RGB"
 
-        try:
-            # Force PDF to Letter-sized (8.5x11) page
-            letter_page = PageObject.create_blank_page(width=(LETTER_WIDTH_PX * (72.0 / DPI)), height=(LETTER_HEIGHT_PX * (72.0 / DPI)))
-            letter_page.merge_page(pdf_reader.pages[0])
-
-            # Save PDF
-            pdf_path = os.path.join(temp_dir, f"file_{identifier}.pdf")
-            pdf_writer = PdfWriter()
-            pdf_writer.add_page(letter_page)
-            with open(pdf_path, "wb") as f:
-                pdf_writer.write(f)
-
-            return pdf_path
-        finally:
-            pdf_reader.close()
+        # OCR and convert to PDF. Tesseract's cost grows with the pixel count, so pages whose longest
+        # edge exceeds OCR_MAX_EDGE are OCRed from a downscaled copy and the text layer is laid over
+        # the full-resolution image.
+        ocr_dpi = min(DPI, DPI * OCR_MAX_EDGE // max(image.size)) if OCR_MAX_EDGE > 0 else DPI
+        if not ocr or _is_blank(image):
+            # Image-only page; Tesseract would find no text (or the text is already known)
+            logger.debug(f"Skipping OCR for {image_filename} ({'blank page' if ocr else 'OCR disabled'})")
+            pdf_buffer = _jpeg_page_pdf(jpeg_bytes, image.size, jpeg_mode, DPI)
+        else:
+            # OCR a text-only page and draw the image under it. Tesseract binarizes a grayscale
+            # copy of its input anyway, so it is handed one directly: a third of the pixel data
+            # to resize, stage and load. The page keeps the color image.
+            ocr_size = (max(1, image.width * ocr_dpi // DPI), max(1, image.height * ocr_dpi // DPI))
+            with image.convert("L") as gray_image:
+                with gray_image.resize(ocr_size, Image.Resampling.BILINEAR, reducing_gap=2.0) if ocr_size != image.size else nullcontext(gray_image) as ocr_image:
+                    with _letter_canvas(ocr_image, ocr_dpi) as ocr_canvas:
+                        text_pdf_bytes = _ocr_image_to_pdf(ocr_canvas, ocr_dpi)
+            logger.debug(f"OCRed {image.width}x{image.height} image at {ocr_size[0]}x{ocr_size[1]} ({ocr_dpi} DPI)")
+
+            # Tesseract's page is already letter-sized; add the image to it in place, without
+            # parsing or re-encoding its text stream
+            with pikepdf.Pdf.open(io.BytesIO(text_pdf_bytes)) as text_pdf:
+                _draw_jpeg(text_pdf, text_pdf.pages[0], jpeg_bytes, image.size, jpeg_mode, DPI)
+
+                # Save PDF
+                pdf_buffer = BytesIO()
+                text_pdf.save(pdf_buffer, stream_decode_level=pikepdf.StreamDecodeLevel.none)
+
+        pdf_buffer.seek(0)
+        return pdf_buffer
     finally:
         image.close()
 
 
-def convert_to_pdf(file_bytes: bytes, content_type: str, temp_dir: str, identifier: str) -> Optional[str]:
+def _write_pdf(pdf: Union[BytesIO, str], path: str) -> None:
+    """Write a PDF held as an in-memory buffer or a file path to path."""
+    if isinstance(pdf, str):
+        shutil.copyfile(pdf, path)
+    else:
+        with open(path, "wb") as f:
+            f.write(pdf.getbuffer())
+
+
+def _save_debug_copy(pdf: Union[BytesIO, str], temp_dir: str, identifier: str) -> None:
+    """Write a converted PDF to temp_dir for debugging when KEEP_FILES is set."""
+    if not KEEP_FILES:
+        return
+    _write_pdf(pdf, os.path.join(temp_dir, f"file_{identifier}.pdf"))
+
+
+# Signatures (offset, bytes) of the formats we handle. Servers often label files
+# application/octet-stream (or mislabel them), so these take precedence over the declared content-type.
+MAGIC_NUMBERS = (
+    (0, b"%PDF", "pdf"),
+    (0, b"\x89PNG\r\n\x1a\n", "png"),
+    (0, b"\xff\xd8\xff", "jpeg"),
+    (0, b"\x00\x00\x00\x0cjP  \r\n\x87\n", "jpeg2000"),
+    (0, b"\xff\x4f\xff\x51", "jpeg2000"),
+    (0, b"II*\x00", "tiff"),
+    (0, b"MM\x00*", "tiff"),
+    (0, b"GIF8", "gif"),
+    (8, b"WEBP", "webp"),  # RIFF container, format at offset 8
+)
+
+
+# Enough leading bytes to match any of MAGIC_NUMBERS
+SNIFF_BYTES = max(offset + len(magic) for offset, magic, _ in MAGIC_NUMBERS)
+
+
+def sniff_file_type(file_bytes: bytes) -> Optional[str]:
+    """Identify a file from its leading bytes. Returns None for unrecognized formats."""
+    return next((file_type for offset, magic, file_type in MAGIC_NUMBERS if file_bytes.startswith(magic, offset)), None)
+
+
+def is_pdf(file_bytes: bytes, content_type: str) -> bool:
+    """Check whether a downloaded file is already a PDF, falling back to the content-type for unrecognized bytes."""
+    file_type = sniff_file_type(file_bytes)
+    return file_type == "pdf" or (file_type is None and content_type == "application/pdf")
+
+
+def convert_to_pdf(source: Union[bytes, str], content_type: str, temp_dir: str, identifier: str, ocr: bool = True) -> Optional[Union[BytesIO, str]]:
     """
-    Convert a file to PDF if it's not already a PDF.
-    Returns the path to the PDF file.
+    Convert a file, given as its bytes or its path, to PDF if it's not already a PDF.
+    PDFs are used as they are, with whatever text layer they already have; images are OCRed unless ocr is False.
+    Returns the PDF as an in-memory buffer (or the path of a PDF source), or None if the file could not be converted.
+    temp_dir only receives a copy of the PDF when KEEP_FILES is set.
     """
+    if isinstance(source, str):
+        with open(source, "rb") as f:
+            head = f.read(SNIFF_BYTES)
+    else:
+        head = bytes(source[:SNIFF_BYTES])
+
     # Check if already a PDF
-    if content_type == "application/pdf" or file_bytes.startswith(b"%PDF"):
-        # Save as-is
-        pdf_path = os.path.join(temp_dir, f"file_{identifier}.pdf")
-        with open(pdf_path, "wb") as f:
-            f.write(file_bytes)
-        return pdf_path
+    if is_pdf(head, content_type):
+        # Use as-is
+        pdf = source if isinstance(source, str) else BytesIO(source)
+        _save_debug_copy(pdf, temp_dir, identifier)
+        return pdf
     
     # Convert image formats to PDF
-    if content_type.startswith("image/"):
+    if sniff_file_type(head) is not None or content_type.startswith("image/"):
         try:
-            return _fit_image_to_pdf(file_bytes, temp_dir, identifier)
+            pdf_buffer = _fit_image_to_pdf(source, ocr)
         except Exception as e:
             logger.error(f"Failed to convert image {identifier} to PDF: {str(e)}")
             return None
+        _save_debug_copy(pdf_buffer, temp_dir, identifier)
+        return pdf_buffer
     
     # For other formats, try to treat as image
     try:
-        return _fit_image_to_pdf(file_bytes, temp_dir, identifier)
+        pdf_buffer = _fit_image_to_pdf(source, ocr)
     except Exception as e:
         logger.warning(f"Could not convert file {identifier} with content-type {content_type}: {str(e)}")
         return None
+    _save_debug_copy(pdf_buffer, temp_dir, identifier)
+    return pdf_buffer
 
 
-def merge_pdf_files(pdf_entries: list, temp_dir: str) -> str:
+def merge_pdf_files(pdf_entries: list, temp_dir: str) -> BytesIO:
     """
     Merge multiple PDF files into a single PDF with outline entries.
-    pdf_entries: List of tuples (pdf_path, title)
-    Returns the path to the merged PDF.
+    pdf_entries: List of tuples (pdf, title), where pdf is a path or a binary stream
+    Returns the merged PDF as an in-memory buffer; it is also written to temp_dir when KEEP_FILES is set.
     """
-    writer = PdfWriter()
-
     try:
-        for pdf_path, title in pdf_entries:
-            try:
-                reader = PdfReader(pdf_path)
-                try:
-                    # Record the current page number before adding pages
-                    page_number = len(writer.pages)
-
-                    for page in reader.pages:
-                        writer.add_page(page)
-
-                    # Add outline entry for this PDF at its starting page
-                    if title:
-                        writer.add_outline_item(title, page_number)
-                        logger.debug(f"Added outline item '{title}' at page {page_number}")
-                finally:
-                    reader.close()
-            except Exception as e:
-                logger.error(f"Failed to read PDF {pdf_path}: {e}")
-                raise
+        with pikepdf.Pdf.new() as merged, ExitStack() as sources:
+            with merged.open_outline() as outline:
+                for pdf, title in pdf_entries:
+                    try:
+                        # Sources stay open until the merged PDF is saved, as qpdf copies stream data lazily.
+                        # Downloaded PDFs are memory-mapped rather than read into qpdf's buffers.
+                        access_mode = pikepdf.AccessMode.mmap if isinstance(pdf, str) else pikepdf.AccessMode.default
+                        src = sources.enter_context(pikepdf.Pdf.open(pdf, access_mode=access_mode))
+
+                        # Record the current page number before adding pages
+                        page_number = len(merged.pages)
+
+                        # Copy the pages natively in qpdf, without walking the object graph in Python
+                        merged.pages.extend(src.pages)
+
+                        # Add outline entry for this PDF at its starting page
+                        if title and len(src.pages) > 0:
+                            outline.root.append(pikepdf.OutlineItem(title, page_number))
+                            logger.debug(f"Added outline item '{title}' at page {page_number}")
+                    except Exception as e:
+                        logger.error(f"Failed to read PDF for '{title}': {e}")
+                        raise
+
+            # Keep already-encoded streams as they are rather than decoding and re-encoding them
+            merged_buffer = BytesIO()
+            merged.save(merged_buffer, stream_decode_level=pikepdf.StreamDecodeLevel.none)
 
-        merged_path = os.path.join(temp_dir, "merged.pdf")
-        with open(merged_path, "wb") as out_f:
-            writer.write(out_f)
+        if KEEP_FILES:
+            merged_path = os.path.join(temp_dir, "merged.pdf")
+            with open(merged_path, "wb") as out_f:
+                out_f.write(merged_buffer.getbuffer())
+            logger.debug(f"Successfully merged PDFs to: {merged_path}")
 
-        logger.debug(f"Successfully merged PDFs to: {merged_path}")
-        return merged_path
+        merged_buffer.seek(0)
+        return merged_buffer
 
     except Exception as e:
         logger.error(f"Failed to merge PDFs: {str(e)}")
@@ -473,4 +1102,4 @@ def merge_pdf_files(pdf_entries: list, temp_dir: str) -> str:
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    uvicorn.run(app, host="0.0.0.0", port=8000, loop="uvloop", http="httptools")
@@ -1,10 +1,14 @@
+import io
 import os
 import sys
 import tempfile
+import asyncio
 import pytest
 import base64
 import json
+from contextlib import asynccontextmanager
 from unittest.mock import patch, MagicMock
+from PIL import Image
 from pypdf import PdfReader
 from fastapi.testclient import TestClient
 
@@ -15,6 +19,61 @@ from app.main import convert_to_pdf, merge_pdf_files, DPI, LETTER_WIDTH_PX, LETT
 
 ASSETS_DIR = os.path.join(os.path.dirname(__file__), "assets")
 
+
+class MockResponse:
+    """Stand-in for an httpx response."""
+    def __init__(self, json_data=None, content=None, headers=None, status_code=200):
+        self._json_data = json_data
+        self.content = content if content is not None else json.dumps(json_data).encode()
+        self.headers = headers or {}
+        self.status_code = status_code
+
+    def json(self):
+        return self._json_data
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise Exception(f"{self.status_code} Error")
+
+    async def aiter_bytes(self, chunk_size=None):
+        yield self.content
+
+
+class MockAsyncClient:
+    """
+    Stand-in for the shared httpx.AsyncClient. GETs (and streamed downloads) are answered by
+    route(url, headers), PUTs by on_put(url, **kwargs); GETs are recorded in requests.
+    """
+    def __init__(self, route=None, on_put=None, **kwargs):
+        self.route = route
+        self.on_put = on_put
+        self.requests = []
+
+    async def aclose(self):
+        pass
+
+    async def put(self, url, **kwargs):
+        # Collect the streamed request body
+        kwargs["content"] = b"".join([chunk async for chunk in kwargs["content"]])
+        return self.on_put(url, **kwargs)
+
+    @asynccontextmanager
+    async def stream(self, method, url, **kwargs):
+        # File downloads are streamed; serve them from the same routes as get
+        yield await self.get(url, **kwargs)
+
+    async def get(self, url, **kwargs):
+        headers = kwargs.get("headers") or {}
+        self.requests.append((url, headers))
+        return self.route(url, headers)
+
+
+def jpeg_bytes(color, size=(200, 260)):
+    """A small solid-color RGB JPEG that fits the letter page without scaling."""
+    buffer = io.BytesIO()
+    Image.new("RGB", size, color).save(buffer, format="JPEG")
+    return buffer.getvalue()
+
 def test_broken_jpf():
     image_path = os.path.join(ASSETS_DIR, "PALGEN_SEP-2736_Adjusted.jpf")
     with open(image_path, "rb") as f:
@@ -22,7 +81,7 @@ def test_broken_jpf():
     with tempfile.TemporaryDirectory() as temp_dir:
         converted_pdf = convert_to_pdf(image_bytes, "application/octet-stream", temp_dir, "photo")
         assert converted_pdf is not None
-        assert os.path.exists(converted_pdf)
+        assert len(PdfReader(converted_pdf).pages) == 1
 
 def test_image_conversion_and_page_merging():
     # Static test files
@@ -38,7 +97,8 @@ def test_image_conversion_and_page_merging():
         # Convert image to PDF
         converted_pdf = convert_to_pdf(image_bytes, "image/jpf", temp_dir, "cover")
         assert converted_pdf is not None
-        assert os.path.exists(converted_pdf)
+        assert len(PdfReader(converted_pdf).pages) == 1
+        converted_pdf.seek(0)
 
         # Save the static PDF for merging
         static_pdf_path = os.path.join(temp_dir, "score.pdf")
@@ -52,7 +112,6 @@ def test_image_conversion_and_page_merging():
         ]
         merged_pdf = merge_pdf_files(pdf_entries, temp_dir)
         assert merged_pdf is not None
-        assert os.path.exists(merged_pdf)
 
         # Check merged PDF page count
         reader = PdfReader(merged_pdf)
@@ -72,8 +131,6 @@ def test_merge_pdfs_endpoint(monkeypatch):
     # Import app.main to use for monkeypatching, but save app reference first
     import app.main as app_main
 
-    client = TestClient(app)
-
     # Create base64 encoded event JSON
     event_data = {
         "object": {
@@ -117,74 +174,51 @@ def test_merge_pdfs_endpoint(monkeypatch):
         }
     ]
 
-    # Create mock response objects
-    class MockResponse:
-        def __init__(self, json_data=None, content=None, headers=None):
-            self._json_data = json_data
-            self.content = content
-            self.headers = headers or {}
-
-        def json(self):
-            return self._json_data
-
-        def raise_for_status(self):
-            pass
-
-    # Create a mock client that returns different responses
-    class MockClient:
-        def __init__(self, **kwargs):
-            pass
-
-        def __enter__(self):
-            return self
-
-        def __exit__(self, *args):
-            pass
-
-        def get(self, url, **kwargs):
-            if "members-list" in url:
-                return MockResponse(json_data=members_data)
-            elif "term_from_term_name" in url:
-                return MockResponse(json_data=[
-                    {
-                        "tid": [
-                            {
-                                "value": "12345"
-                            }
-                        ]
-                    }
-                ])
-            elif "file1.jpf" in url:
-                # Return JPF file
-                return MockResponse(
-                    json_data=None,
-                    content=file1_bytes,
-                    headers={"content-type": "image/jpf"}
-                )
-            elif "file2.pdf" in url:
-                # Return PDF file
-                return MockResponse(
-                    json_data=None,
-                    content=file2_bytes,
-                    headers={"content-type": "application/pdf"}
-                )
-            elif "MISSING" in url:
-                # Simulate missing file
-                response = MockResponse()
-                response.raise_for_status = MagicMock(side_effect=Exception("404 Not Found"))
-                return response
-            else:
-                # Default file download
-                return MockResponse(
-                    json_data=None,
-                    content=file2_bytes,
-                    headers={"content-type": "application/pdf"}
-                )
-
-    # Mock the httpx.Client
-    monkeypatch.setattr(app_main.httpx, "Client", MockClient)
-
-    # Mock the sync httpx.put and save the file for manual review
+    # Serve the members list, the TID lookup and the member files
+    def route(url, headers):
+        if "members-list" in url:
+            return MockResponse(json_data=members_data)
+        elif "term_from_term_name" in url:
+            return MockResponse(json_data=[
+                {
+                    "tid": [
+                        {
+                            "value": "12345"
+                        }
+                    ]
+                }
+            ])
+        elif "file1.jpf" in url:
+            # Return JPF file
+            return MockResponse(
+                json_data=None,
+                content=file1_bytes,
+                headers={"content-type": "image/jpf"}
+            )
+        elif "file2.pdf" in url:
+            # Return PDF file
+            return MockResponse(
+                json_data=None,
+                content=file2_bytes,
+                headers={"content-type": "application/pdf"}
+            )
+        elif "MISSING" in url:
+            # Simulate missing file
+            response = MockResponse()
+            response.raise_for_status = MagicMock(side_effect=Exception("404 Not Found"))
+            return response
+        else:
+            # Default file download
+            return MockResponse(
+                json_data=None,
+                content=file2_bytes,
+                headers={"content-type": "application/pdf"}
+            )
+
+    # Mock the shared httpx.AsyncClient created in the app lifespan
+    monkeypatch.setattr(app_main.httpx, "AsyncClient", lambda **kwargs: MockAsyncClient(route, mock_put))
+
+    # Mock the client's put and save the file for manual review
     put_called = []
     output_dir = "/app/test_output"
     os.makedirs(output_dir, exist_ok=True)
@@ -194,25 +228,23 @@ def test_merge_pdfs_endpoint(monkeypatch):
 
         # Save the PDF file content to disk for manual review
         if "content" in kwargs:
-            # kwargs["content"] is a file-like object
-            file_obj = kwargs["content"]
+            # kwargs["content"] is the merged PDF bytes
             output_path = os.path.join(output_dir, "merged_output.pdf")
             with open(output_path, "wb") as out_file:
-                out_file.write(file_obj.read())
+                out_file.write(kwargs["content"])
             print(f"\nMerged PDF saved to: {output_path}")
 
         response = MagicMock()
         response.raise_for_status = MagicMock()
         return response
 
-    monkeypatch.setattr(app_main.httpx, "put", mock_put)
-
     # Make the request to /merge endpoint
     headers = {
         "X-Islandora-Event": encoded_event,
         "Authorization": "Bearer test-token"
     }
-    response = client.get("/merge", headers=headers)
+    with TestClient(app) as client:
+        response = client.get("/merge", headers=headers)
 
     # Verify the response
     assert response.status_code == 200, f"Expected 200, got {response.status_code}. Response: {response.json()}"
@@ -223,4 +255,341 @@ def test_merge_pdfs_endpoint(monkeypatch):
     assert len(put_called) > 0
     put_url, put_kwargs = put_called[0]
     assert "media/document" in put_url
-    assert put_kwargs["headers"]["Content-Type"] == "application/pdf"
\ No newline at end of file
+    assert put_kwargs["headers"]["Content-Type"] == "application/pdf"
+    assert put_kwargs["headers"]["Content-Length"] == str(len(put_kwargs["content"]))
+    assert len(PdfReader(io.BytesIO(put_kwargs["content"])).pages) == 4  # 1 from image + 3 from score PDF
+
+@pytest.fixture
+def file_cache(monkeypatch, tmp_path):
+    """Give each test an empty conversion cache, and convert in a thread rather than the process pool."""
+    import app.main as app_main
+    cache_dir = tmp_path / "cache"
+    cache_dir.mkdir()
+    monkeypatch.setattr(app_main, "CACHE_DIR", str(cache_dir))
+    monkeypatch.setattr(app_main, "FILE_ETAGS", {})
+    monkeypatch.setattr(app_main, "CONVERT_POOL", None)
+    return app_main
+
+
+def fetch(app_main, client, processing_dir, url, ocr=False):
+    """Run fetch_and_convert for a single file URL."""
+    return asyncio.run(app_main.fetch_and_convert(client, asyncio.Semaphore(1), "nid1", [url], str(processing_dir), ocr))
+
+
+def test_file_cache_revalidates_with_etag(file_cache, monkeypatch, tmp_path):
+    url = "http://localhost:8000/resource/item1/page.jpg"
+
+    def route(url, headers):
+        if headers.get("If-None-Match") == '"v1"':
+            return MockResponse(content=b"", status_code=304)
+        return MockResponse(content=jpeg_bytes("red"), headers={"content-type": "image/jpeg", "etag": '"v1"'})
+
+    client = MockAsyncClient(route)
+    first = fetch(file_cache, client, tmp_path, url)
+    assert file_cache.FILE_ETAGS[(url, False)] == '"v1"'
+
+    # An unchanged file is taken from the cache, without converting it again
+    monkeypatch.setattr(file_cache, "convert_to_pdf", MagicMock(side_effect=AssertionError("converted again")))
+    second = fetch(file_cache, client, tmp_path, url)
+    assert client.requests[-1][1]["If-None-Match"] == '"v1"'
+    assert isinstance(second, str) and os.path.dirname(second) == str(tmp_path)
+    with open(second, "rb") as f:
+        assert f.read() == first.getvalue()
+
+
+def test_file_cache_replaces_changed_file(file_cache, tmp_path):
+    url = "http://localhost:8000/resource/item1/page.jpg"
+    served = {"etag": '"v1"', "content": jpeg_bytes("red")}
+
+    def route(url, headers):
+        if headers.get("If-None-Match") == served["etag"]:
+            return MockResponse(content=b"", status_code=304)
+        return MockResponse(content=served["content"], headers={"content-type": "image/jpeg", "etag": served["etag"]})
+
+    client = MockAsyncClient(route)
+    first = fetch(file_cache, client, tmp_path, url)
+
+    # The file is replaced under the same URL: the server answers the old ETag with the new file
+    served.update(etag='"v2"', content=jpeg_bytes("blue"))
+    client.route = lambda url, headers: MockResponse(content=served["content"], headers={"content-type": "image/jpeg", "etag": served["etag"]})
+    second = fetch(file_cache, client, tmp_path, url)
+    assert client.requests[-1][1]["If-None-Match"] == '"v1"'
+    assert second.getvalue() != first.getvalue()
+    assert file_cache.FILE_ETAGS[(url, False)] == '"v2"'
+    with open(file_cache._file_cache_path(url, False), "rb") as f:
+        assert f.read() == second.getvalue()
+
+
+def test_file_cache_skips_pdfs(file_cache, tmp_path):
+    url = "http://localhost:8000/resource/item2/file2.pdf"
+    with open(os.path.join(ASSETS_DIR, "SM219_WeGetUpAt8AM_1900_Score.pdf"), "rb") as f:
+        pdf_bytes = f.read()
+    client = MockAsyncClient(lambda url, headers: MockResponse(content=pdf_bytes, headers={"content-type": "application/pdf", "etag": '"v1"'}))
+    result = fetch(file_cache, client, tmp_path, url)
+    assert isinstance(result, str)
+    assert not file_cache.FILE_ETAGS
+    assert not os.listdir(file_cache.CACHE_DIR)
+
+
+def test_file_cache_eviction(file_cache, monkeypatch, tmp_path):
+    pdf = io.BytesIO(b"%PDF-" + b"0" * 1000)
+    monkeypatch.setattr(file_cache, "CACHE_MAX_BYTES", 1500)
+    file_cache.store_cached_image("a", True, pdf)
+    file_cache.store_cached_file("http://localhost/a", True, '"a"', "a")
+    # Make the first PDF the least recently used
+    os.utime(file_cache._file_cache_path("http://localhost/a", True), (0, 0))
+    file_cache.store_cached_image("b", True, pdf)
+    file_cache.store_cached_file("http://localhost/b", True, '"b"', "b")
+
+    # Evicting a file's PDF also forgets its ETag
+    assert ("http://localhost/a", True) not in file_cache.FILE_ETAGS
+    assert file_cache.read_cached_file("http://localhost/a", True, str(tmp_path / "a.pdf")) is None
+    assert file_cache.read_cached_file("http://localhost/b", True, str(tmp_path / "b.pdf")) == '"b"'
+    assert os.path.exists(tmp_path / "b.pdf")
+    # The ETag entry is a link to the content entry, not a second copy
+    assert sorted(os.listdir(file_cache.CACHE_DIR)) == sorted(["image_b.pdf", os.path.basename(file_cache._file_cache_path("http://localhost/b", True))])
+    assert os.stat(tmp_path / "b.pdf").st_nlink == 3
+
+
+def test_file_cache_keyed_by_ocr(file_cache, tmp_path):
+    # A file converted without OCR is not reused once its member needs OCR
+    pdf = io.BytesIO(b"%PDF-" + b"0" * 100)
+    file_cache.store_cached_image("a", False, pdf)
+    file_cache.store_cached_file("http://localhost/a", False, '"a"', "a")
+    assert file_cache.read_cached_file("http://localhost/a", True, str(tmp_path / "ocr.pdf")) is None
+    assert file_cache.read_cached_file("http://localhost/a", False, str(tmp_path / "noocr.pdf")) == '"a"'
+
+
+def test_is_blank():
+    from PIL import ImageDraw
+    from app.main import _is_blank
+
+    page = Image.effect_noise((1275, 1650), 8).point(lambda value: 240 + value // 32).convert("RGB")
+    assert _is_blank(page)
+
+    # A line of text, roughly
+    ImageDraw.Draw(page).rectangle((100, 100, 600, 112), fill="black")
+    assert not _is_blank(page)
+
+
+def test_merge_skips_ocr_for_members_with_ocr_text(monkeypatch):
+    import pikepdf
+    import app.main as app_main
+
+    event_data = {"object": {"url": [{"href": "http://localhost:8000/resource/item1", "rel": "canonical"}]}}
+    members_data = [
+        {"nid": "item1", "title": "Transcribed", "field_ocr_text": "Known text", "field_document": "http://localhost:8000/file1.jpg"},
+        {"nid": "item2", "title": "Not transcribed", "field_ocr_text": "", "field_document": "http://localhost:8000/file2.jpg"},
+    ]
+
+    def route(url, headers):
+        if "members-list" in url:
+            return MockResponse(json_data=members_data)
+        return MockResponse(json_data=[{"tid": [{"value": "12345"}]}])
+
+    # Record whether each nid would be OCRed instead of converting anything
+    ocr_by_nid = {}
+
+    async def fake_fetch_and_convert(client, semaphore, nid, file_urls, processing_dir, ocr=True):
+        ocr_by_nid[nid] = ocr
+        pdf_buffer = io.BytesIO()
+        with pikepdf.Pdf.new() as pdf:
+            pdf.add_blank_page()
+            pdf.save(pdf_buffer)
+        pdf_buffer.seek(0)
+        return pdf_buffer
+
+    monkeypatch.setattr(app_main, "OCR_ENABLED", True)
+    monkeypatch.setattr(app_main, "fetch_and_convert", fake_fetch_and_convert)
+    monkeypatch.setattr(app_main.httpx, "AsyncClient", lambda **kwargs: MockAsyncClient(route, lambda url, **kwargs: MagicMock()))
+
+    headers = {"X-Islandora-Event": base64.b64encode(json.dumps(event_data).encode()).decode()}
+    with TestClient(app) as client:
+        response = client.get("/merge", headers=headers)
+
+    assert response.status_code == 200, response.json()
+    assert ocr_by_nid == {"item1": False, "item2": True}
+
+
+def test_parse_tess_config():
+    from tesserocr import OEM, PSM
+    from app.main import _parse_tess_config
+
+    assert _parse_tess_config("-l eng --oem 1 --psm 6 -c tessedit_do_invert=0") == ("eng", 1, 6, {"tessedit_do_invert": "0"})
+    assert _parse_tess_config("") == ("eng", OEM.DEFAULT, PSM.AUTO, {})
+    # --dpi is accepted for compatibility with tesseract command lines, and ignored
+    assert _parse_tess_config("--dpi 300 -l deu+eng") == ("deu+eng", OEM.DEFAULT, PSM.AUTO, {})
+
+    for config in ("--tessdata-dir /tmp", "--psm", "--oem lstm", "-c tessedit_do_invert"):
+        with pytest.raises(ValueError):
+            _parse_tess_config(config)
+
+
+def test_ocr_resolution_follows_page_size(monkeypatch):
+    import pikepdf
+    import app.main as app_main
+
+    # Record the DPI each page is OCRed at, with an empty text layer in place of Tesseract's
+    ocr_dpis = []
+
+    def fake_ocr_image_to_pdf(image, dpi):
+        ocr_dpis.append(dpi)
+        pdf_buffer = io.BytesIO()
+        with pikepdf.Pdf.new() as pdf:
+            pdf.add_blank_page(page_size=app_main.LETTER_SIZE_PT)
+            pdf.save(pdf_buffer)
+        return pdf_buffer.getvalue()
+
+    monkeypatch.setattr(app_main, "_ocr_image_to_pdf", fake_ocr_image_to_pdf)
+    monkeypatch.setattr(app_main, "OCR_MAX_EDGE", 1500)
+
+    def page(size):
+        image = Image.new("RGB", size, "white")
+        image.paste((0, 0, 0), (50, 50, 400, 62))
+        buffer = io.BytesIO()
+        image.save(buffer, format="PNG")
+        return buffer.getvalue()
+
+    # A page within OCR_MAX_EDGE is OCRed at full resolution, a larger one from a downscaled copy
+    app_main._fit_image_to_pdf(page((800, 1000)))
+    app_main._fit_image_to_pdf(page((LETTER_WIDTH_PX, LETTER_HEIGHT_PX)))
+    assert ocr_dpis[0] == DPI
+    assert ocr_dpis[1] == min(DPI, DPI * 1500 // LETTER_HEIGHT_PX)
+
+
+def test_service_file_tid_cache(monkeypatch):
+    import time
+    import app.main as app_main
+    monkeypatch.setattr(app_main, "_TID_CACHE", {})
+    base_url = "http://localhost:8000"
+    responses = [MockResponse(status_code=503), MockResponse([{"tid": [{"value": 5}]}]), MockResponse([{"tid": [{"value": 6}]}])]
+    client = MockAsyncClient(lambda url, headers: responses.pop(0))
+
+    def lookup():
+        return asyncio.run(app_main.get_service_file_tid(client, base_url, "Bearer token"))
+
+    # A failed lookup isn't cached
+    with pytest.raises(Exception, match="503"):
+        lookup()
+    assert base_url not in app_main._TID_CACHE
+
+    # The next lookup is cached, so a repeat within the TTL makes no request
+    assert lookup() == 5
+    assert lookup() == 5
+    assert len(client.requests) == 2
+
+    # Once the TTL has passed, the TID is looked up again
+    app_main._TID_CACHE[base_url] = (5, time.monotonic() - app_main.TID_CACHE_TTL - 1)
+    assert lookup() == 6
+    assert len(client.requests) == 3
+
+
+@pytest.mark.parametrize("head, file_type", [
+    (b"%PDF-1.7\n", "pdf"),
+    (b"\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR", "png"),
+    (b"\xff\xd8\xff\xe0\x00\x10JFIF", "jpeg"),
+    (b"\x00\x00\x00\x0cjP  \r\n\x87\n", "jpeg2000"),
+    (b"\xff\x4f\xff\x51\x00\x2f", "jpeg2000"),
+    (b"II*\x00\x08\x00\x00\x00", "tiff"),
+    (b"MM\x00*\x00\x00\x00\x08", "tiff"),
+    (b"GIF89a", "gif"),
+    (b"RIFF\x24\x00\x00\x00WEBPVP8 ", "webp"),
+    (b"WEBP", None),
+    (b"<html><body>", None),
+    (b"", None),
+])
+def test_sniff_file_type(head, file_type):
+    from app.main import sniff_file_type
+    assert sniff_file_type(head) == file_type
+
+
+@pytest.mark.parametrize("head, content_type, expected", [
+    (b"%PDF-1.7\n", "application/pdf", True),
+    (b"%PDF-1.7\n", "application/octet-stream", True),
+    (b"\xff\xd8\xff\xe0\x00\x10JFIF", "application/pdf", False),
+    (b"RIFF\x24\x00\x00\x00WEBPVP8 ", "application/pdf", False),
+    (b"<html><body>", "application/pdf", True),
+    (b"<html><body>", "text/html", False),
+])
+def test_is_pdf(head, content_type, expected):
+    from app.main import is_pdf
+    assert is_pdf(head, content_type) is expected
+
+
+def test_convert_to_pdf_dispatches_on_content(tmp_path):
+    # An image served as a PDF is still converted
+    result = convert_to_pdf(jpeg_bytes("red"), "application/pdf", str(tmp_path), "image", ocr=False)
+    assert len(PdfReader(result).pages) == 1
+
+    # A PDF served as application/octet-stream is used as it is, whether given as bytes or a path
+    pdf_path = tmp_path / "document.pdf"
+    pdf_path.write_bytes(result.getvalue())
+    assert convert_to_pdf(result.getvalue(), "application/octet-stream", str(tmp_path), "pdf").getvalue() == result.getvalue()
+    assert convert_to_pdf(str(pdf_path), "application/octet-stream", str(tmp_path), "pdf") == str(pdf_path)
+
+
+@pytest.mark.parametrize("ocr", [False, True])
+def test_jpeg_embedded_without_reencoding(tmp_path, ocr):
+    import pikepdf
+    from PIL import ImageDraw
+
+    # A JPEG that fits the letter page is embedded as it is, with or without a text layer
+    image = Image.new("RGB", (200, 260), "white")
+    ImageDraw.Draw(image).rectangle((20, 40, 180, 60), fill="black")
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG")
+    source = buffer.getvalue()
+
+    result = convert_to_pdf(source, "image/jpeg", str(tmp_path), "jpeg", ocr=ocr)
+    with pikepdf.Pdf.open(result) as pdf:
+        xobjects = pdf.pages[0].Resources.XObject
+        images = [xobjects[name] for name in xobjects.keys() if xobjects[name].Subtype == pikepdf.Name.Image]
+        assert len(images) == 1
+        assert images[0].Filter == pikepdf.Name.DCTDecode
+        assert images[0].read_raw_bytes() == source
+
+
+def test_download_storage_error_fails_merge(file_cache, tmp_path):
+    # A file that can't be written locally fails the merge instead of being left out of it
+    url = "http://localhost:8000/resource/item1/page.jpg"
+    client = MockAsyncClient(lambda url, headers: MockResponse(content=jpeg_bytes("red"), headers={"content-type": "image/jpeg"}))
+    with pytest.raises(OSError):
+        asyncio.run(file_cache.fetch_and_convert(client, asyncio.Semaphore(1), "nid1", [url, url + "?2"], str(tmp_path / "missing"), False))
+    assert len(client.requests) == 1
+
+
+def test_broken_convert_pool_is_replaced(file_cache, monkeypatch, tmp_path):
+    from concurrent.futures import Executor, ThreadPoolExecutor
+    from concurrent.futures.process import BrokenProcessPool
+
+    class BrokenPool(Executor):
+        """A pool one of whose workers has died."""
+        def submit(self, fn, *args, **kwargs):
+            raise BrokenProcessPool("A worker process terminated abruptly")
+
+    broken_pool, new_pool = BrokenPool(), ThreadPoolExecutor(max_workers=1)
+    monkeypatch.setattr(file_cache, "CONVERT_POOL", broken_pool)
+    monkeypatch.setattr(file_cache, "_new_convert_pool", lambda: new_pool)
+
+    # The conversion is retried in a new pool, which later conversions use too
+    url = "http://localhost:8000/resource/item1/page.jpg"
+    client = MockAsyncClient(lambda url, headers: MockResponse(content=jpeg_bytes("red"), headers={"content-type": "image/jpeg"}))
+    try:
+        assert len(PdfReader(fetch(file_cache, client, tmp_path, url)).pages) == 1
+        assert file_cache.CONVERT_POOL is new_pool
+    finally:
+        new_pool.shutdown()
+
+
+def test_letter_canvas_pool_keeps_one_canvas():
+    import app.main as app_main
+    image = Image.new("L", (100, 100), 0)
+    for dpi in (100, 120, 100):
+        with app_main._letter_canvas(image, dpi) as canvas:
+            assert canvas.size == (int(8.5 * dpi), int(11.0 * dpi))
+            assert canvas.getpixel((0, canvas.height - 1)) == 0
+
+    # Only the last canvas is kept, wiped white
+    assert app_main._CANVAS_POOL.qsize() == 1
+    canvas = app_main._CANVAS_POOL.queue[0]
+    assert canvas.size == (850, 1100) and canvas.getextrema() == (255, 255)